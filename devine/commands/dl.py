@@ -575,6 +575,8 @@ class dl:
                 ))
 
                 video_track_n = 0
+                # videos repackaged early for ccextractor, still reported by the repack step below
+                repacked_tracks = []
 
                 while (
                     not title.tracks.subtitles and
@@ -593,6 +595,7 @@ class dl:
                             video_track = title.tracks.videos[video_track_n]
                             track_id = f"ccextractor-{video_track.id}"
                             cc_lang = title.language or video_track.language
+                            needs_repack = video_track.needs_repack
                             cc = video_track.ccextractor(
                                 track_id=track_id,
                                 out_path=config.directories.temp / config.filenames.subtitle.format(
@@ -602,6 +605,8 @@ class dl:
                                 language=cc_lang,
                                 original=False
                             )
+                            if needs_repack and not video_track.needs_repack:
+                                repacked_tracks.append(video_track)
                             if cc:
                                 # will not appear in track listings as it's added after all times it lists
                                 title.tracks.add(cc)
@@ -657,7 +662,9 @@ class dl:
                         self.log.info(f"Attached {font_count} fonts for the Subtitles")
 
                 with console.status("Repackaging tracks with FFMPEG..."):
-                    has_repacked = False
+                    has_repacked = bool(repacked_tracks)
+                    for track in repacked_tracks:
+                        events.emit(events.Types.TRACK_REPACKED, track=track)
                     for track in title.tracks:
                         if track.needs_repack:
                             track.repackage()
@@ -797,7 +804,7 @@ class dl:
                     if kid in drm.content_keys:
                         continue
 
-                    is_track_kid = ["", "*"][kid == track_kid]
+                    is_track_kid = "*" if kid == track_kid else ""
 
                     if not cdm_only:
                         content_key, vault_used = self.vaults.get_key(kid)
@@ -38,9 +38,10 @@ CCExtractor = find(
 HolaProxy = find("hola-proxy")
 MPV = find("mpv")
 Caddy = find("caddy")
+MKVToolNix = find("mkvmerge")
 
 
 __all__ = (
     "FFMPEG", "FFProbe", "FFPlay", "SubtitleEdit", "ShakaPackager",
-    "Aria2", "CCExtractor", "HolaProxy", "MPV", "Caddy", "find"
+    "Aria2", "CCExtractor", "HolaProxy", "MPV", "Caddy", "MKVToolNix", "find"
 )
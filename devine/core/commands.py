@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Any, Optional
 
 import click
 
@@ -14,10 +14,8 @@ _COMMANDS = sorted(
     key=lambda x: x.stem
 )
 
-_MODULES = {
-    path.stem: getattr(import_module_by_path(path), path.stem)
-    for path in _COMMANDS
-}
+# commands are only imported when first requested, most pull in a large tree of dependencies
+_MODULES: dict[str, Any] = {}
 
 
 class Commands(click.MultiCommand):
@@ -31,7 +29,10 @@ class Commands(click.MultiCommand):
         """Load the command code and return the main click command function."""
         module = _MODULES.get(name)
         if not module:
-            raise click.ClickException(f"Unable to find command by the name '{name}'")
+            path = next((x for x in _COMMANDS if x.stem == name), None)
+            if not path:
+                raise click.ClickException(f"Unable to find command by the name '{name}'")
+            module = _MODULES[name] = getattr(import_module_by_path(path), path.stem)
 
         if hasattr(module, "cli"):
             return module.cli
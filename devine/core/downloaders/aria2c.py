@@ -97,36 +97,36 @@ def download(
     if cookies and not isinstance(cookies, CookieJar):
         cookies = cookiejar_from_dict(cookies)
 
-    url_files = []
-    for i, url in enumerate(urls):
-        if isinstance(url, str):
-            url_data = {
-                "url": url
-            }
-        else:
-            url_data: dict[str, Any] = url
-        url_filename = filename.format(
-            i=i,
-            ext=get_extension(url_data["url"])
-        )
-        url_text = url_data["url"]
-        url_text += f"\n\tdir={output_dir}"
-        url_text += f"\n\tout={url_filename}"
-        if cookies:
-            mock_request = requests.Request(url=url_data["url"])
-            cookie_header = get_cookie_header(cookies, mock_request)
-            if cookie_header:
-                url_text += f"\n\theader=Cookie: {cookie_header}"
-        for key, value in url_data.items():
-            if key == "url":
-                continue
-            if key == "headers":
-                for header_name, header_value in value.items():
-                    url_text += f"\n\theader={header_name}: {header_value}"
+    def get_url_files() -> Generator[str, None, None]:
+        """Yield each URL's aria2c input file entry, one at a time."""
+        for i, url in enumerate(urls):
+            if isinstance(url, str):
+                url_data = {
+                    "url": url
+                }
             else:
-                url_text += f"\n\t{key}={value}"
-        url_files.append(url_text)
-    url_file = "\n".join(url_files)
+                url_data: dict[str, Any] = url
+            url_filename = filename.format(
+                i=i,
+                ext=get_extension(url_data["url"])
+            )
+            url_text = url_data["url"]
+            url_text += f"\n\tdir={output_dir}"
+            url_text += f"\n\tout={url_filename}"
+            if cookies:
+                mock_request = requests.Request(url=url_data["url"])
+                cookie_header = get_cookie_header(cookies, mock_request)
+                if cookie_header:
+                    url_text += f"\n\theader=Cookie: {cookie_header}"
+            for key, value in url_data.items():
+                if key == "url":
+                    continue
+                if key == "headers":
+                    for header_name, header_value in value.items():
+                        url_text += f"\n\theader={header_name}: {header_value}"
+                else:
+                    url_text += f"\n\t{key}={value}"
+            yield url_text + "\n"
 
     rpc_port = get_free_port()
     rpc_secret = get_random_bytes(16).hex()
@@ -193,7 +193,9 @@ def download(
             stdout=subprocess.DEVNULL
         )
 
-        p.stdin.write(url_file.encode())
+        # stream the input file entries rather than building one large document in memory
+        for url_file in get_url_files():
+            p.stdin.write(url_file.encode())
         p.stdin.close()
 
         while p.poll() is None:
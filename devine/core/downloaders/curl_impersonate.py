@@ -15,6 +15,7 @@ from devine.core.utilities import get_extension
 
 MAX_ATTEMPTS = 5
 RETRY_WAIT = 2
+MAX_RETRY_WAIT = 30
 CHUNK_SIZE = 1024
 PROGRESS_WINDOW = 5
 BROWSER = config.curl_impersonate.get("browser", "chrome124")
@@ -119,9 +120,14 @@ def download(
                 break
             except Exception as e:
                 save_path.unlink(missing_ok=True)
-                if DOWNLOAD_CANCELLED.is_set() or attempts == MAX_ATTEMPTS:
+                status_code = getattr(getattr(e, "response", None), "status_code", None)
+                if (
+                    DOWNLOAD_CANCELLED.is_set() or attempts == MAX_ATTEMPTS or
+                    # client errors won't resolve by retrying, except for timeouts and rate-limits
+                    (status_code and 400 <= status_code < 500 and status_code not in (408, 429))
+                ):
                     raise e
-                time.sleep(RETRY_WAIT)
+                time.sleep(min(MAX_RETRY_WAIT, RETRY_WAIT ** attempts))
                 attempts += 1
     finally:
         control_file.unlink()
@@ -263,7 +269,7 @@ def curl_impersonate(
                 # the pool is already shut down, so exiting loop is fine
                 raise
             else:
-                yield dict(file_downloaded=file_path)
+                yield dict(file_downloaded=file_path, written=download_size)
                 yield dict(advance=1)
 
                 now = time.time()
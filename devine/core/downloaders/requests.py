@@ -16,6 +16,7 @@ from devine.core.utilities import get_extension
 
 MAX_ATTEMPTS = 5
 RETRY_WAIT = 2
+MAX_RETRY_WAIT = 30
 CHUNK_SIZE = 1024
 PROGRESS_WINDOW = 5
 
@@ -140,9 +141,14 @@ def download(
                 break
             except Exception as e:
                 save_path.unlink(missing_ok=True)
-                if DOWNLOAD_CANCELLED.is_set() or attempts == MAX_ATTEMPTS:
+                status_code = getattr(getattr(e, "response", None), "status_code", None)
+                if (
+                    DOWNLOAD_CANCELLED.is_set() or attempts == MAX_ATTEMPTS or
+                    # client errors won't resolve by retrying, except for timeouts and rate-limits
+                    (status_code and 400 <= status_code < 500 and status_code not in (408, 429))
+                ):
                     raise e
-                time.sleep(RETRY_WAIT)
+                time.sleep(min(MAX_RETRY_WAIT, RETRY_WAIT ** attempts))
                 attempts += 1
     finally:
         control_file.unlink()
@@ -4,6 +4,7 @@ import base64
 import html
 import logging
 import math
+import os
 import re
 import sys
 from copy import copy
@@ -29,6 +30,8 @@ from devine.core.tracks import Audio, Subtitle, Tracks, Video
 from devine.core.utilities import is_close_match, try_ensure_utf8
 from devine.core.utils.xml import load_xml
 
+_ABSOLUTE_URL_RE = re.compile(r"^https?://", re.IGNORECASE)
+
 
 class DASH:
     def __init__(self, manifest, url: str):
@@ -264,7 +267,7 @@ class DASH:
         manifest_base_url = manifest.findtext("BaseURL")
         if not manifest_base_url:
             manifest_base_url = track.url
-        elif not re.match("^https?://", manifest_base_url, re.IGNORECASE):
+        elif not _ABSOLUTE_URL_RE.match(manifest_base_url):
             manifest_base_url = urljoin(track.url, f"./{manifest_base_url}")
         period_base_url = urljoin(manifest_base_url, period.findtext("BaseURL"))
         rep_base_url = urljoin(period_base_url, representation.findtext("BaseURL"))
@@ -300,7 +303,7 @@ class DASH:
                 value = segment_template.get(item)
                 if not value:
                     continue
-                if not re.match("^https?://", value, re.IGNORECASE):
+                if not _ABSOLUTE_URL_RE.match(value):
                     if not rep_base_url:
                         raise ValueError("Resolved Segment URL is not absolute, and no Base URL is available.")
                     value = urljoin(rep_base_url, value)
@@ -373,7 +376,7 @@ class DASH:
                 source_url = initialization.get("sourceURL")
                 if not source_url:
                     source_url = rep_base_url
-                elif not re.match("^https?://", source_url, re.IGNORECASE):
+                elif not _ABSOLUTE_URL_RE.match(source_url):
                     source_url = urljoin(rep_base_url, f"./{source_url}")
 
                 if initialization.get("range"):
@@ -391,7 +394,7 @@ class DASH:
                 media_url = segment_url.get("media")
                 if not media_url:
                     media_url = rep_base_url
-                elif not re.match("^https?://", media_url, re.IGNORECASE):
+                elif not _ABSOLUTE_URL_RE.match(media_url):
                     media_url = urljoin(rep_base_url, f"./{media_url}")
 
                 segments.append((
@@ -500,15 +503,15 @@ class DASH:
                     status_update["downloaded"] = f"DASH {downloaded}"
                 progress(**status_update)
 
-        # see https://github.com/devine-dl/devine/issues/71
-        for control_file in save_dir.glob("*.aria2__temp"):
-            control_file.unlink()
-
-        segments_to_merge = [
-            x
-            for x in sorted(save_dir.iterdir())
-            if x.is_file()
-        ]
+        segments_to_merge = []
+        with os.scandir(save_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".aria2__temp"):
+                    # see https://github.com/devine-dl/devine/issues/71
+                    os.unlink(entry.path)
+                elif entry.is_file():
+                    segments_to_merge.append(Path(entry.path))
+        segments_to_merge.sort()
         with open(save_path, "wb") as f:
             if init_data:
                 f.write(init_data)
@@ -522,15 +525,20 @@ class DASH:
                     track.codec not in (Subtitle.Codec.fVTT, Subtitle.Codec.fTTML)
                 ):
                     segment_data = try_ensure_utf8(segment_data)
-                    segment_data = segment_data.decode("utf8"). \
-                        replace("&lrm;", html.unescape("&lrm;")). \
-                        replace("&rlm;", html.unescape("&rlm;")). \
-                        encode("utf8")
+                    if b"&lrm;" in segment_data or b"&rlm;" in segment_data:
+                        segment_data = segment_data.decode("utf8"). \
+                            replace("&lrm;", html.unescape("&lrm;")). \
+                            replace("&rlm;", html.unescape("&rlm;")). \
+                            encode("utf8")
                 f.write(segment_data)
                 f.flush()
                 segment_file.unlink()
                 progress(advance=1)
 
+            # no point decrypting if nothing was actually downloaded
+            if f.tell() <= 3:  # Empty UTF-8 BOM == 3 bytes
+                raise IOError("Download failed, the merged file is empty.")
+
         track.path = save_path
         events.emit(events.Types.TRACK_DOWNLOADED, track=track)
 
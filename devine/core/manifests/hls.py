@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import html
 import logging
+import os
 import shutil
 import subprocess
 import sys
@@ -245,28 +246,17 @@ class HLS:
         else:
             session_drm = None
 
-        unwanted_segments = [
-            segment for segment in master.segments
-            if callable(track.OnSegmentFilter) and track.OnSegmentFilter(segment)
-        ]
-
-        total_segments = len(master.segments) - len(unwanted_segments)
-        progress(total=total_segments)
-
-        downloader = track.downloader
-        if (
-            downloader.__name__ == "aria2c" and
-            any(x.byterange for x in master.segments if x not in unwanted_segments)
-        ):
-            downloader = requests_downloader
-            log.warning("Falling back to the requests downloader as aria2(c) doesn't support the Range header")
-
+        # filter, resolve, and size up the wanted segments in a single pass, keeping
+        # the unwanted segments by index so later membership checks are O(1)
+        unwanted_segments: set[int] = set()
         urls: list[dict[str, Any]] = []
         segment_durations: list[int] = []
+        has_byte_ranges = False
 
         range_offset = 0
-        for segment in master.segments:
-            if segment in unwanted_segments:
+        for real_i, segment in enumerate(master.segments):
+            if callable(track.OnSegmentFilter) and track.OnSegmentFilter(segment):
+                unwanted_segments.add(real_i)
                 continue
 
             segment_durations.append(int(segment.duration))
@@ -274,6 +264,7 @@ class HLS:
             if segment.byterange:
                 byte_range = HLS.calculate_byte_range(segment.byterange, range_offset)
                 range_offset = byte_range.split("-")[0]
+                has_byte_ranges = True
             else:
                 byte_range = None
 
@@ -286,6 +277,14 @@ class HLS:
 
         track.data["hls"]["segment_durations"] = segment_durations
 
+        total_segments = len(urls)
+        progress(total=total_segments)
+
+        downloader = track.downloader
+        if downloader.__name__ == "aria2c" and has_byte_ranges:
+            downloader = requests_downloader
+            log.warning("Falling back to the requests downloader as aria2(c) doesn't support the Range header")
+
         segment_save_dir = save_dir / "segments"
 
         for status_update in downloader(
@@ -306,9 +305,12 @@ class HLS:
                     status_update["downloaded"] = f"HLS {downloaded}"
                 progress(**status_update)
 
-        # see https://github.com/devine-dl/devine/issues/71
-        for control_file in segment_save_dir.glob("*.aria2__temp"):
-            control_file.unlink()
+        if segment_save_dir.exists():  # not created if every segment was filtered out
+            with os.scandir(segment_save_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".aria2__temp"):
+                        # see https://github.com/devine-dl/devine/issues/71
+                        os.unlink(entry.path)
 
         progress(total=total_segments, completed=0, downloaded="Merging")
 
@@ -321,141 +323,146 @@ class HLS:
         else:
             encryption_data: Optional[tuple[Optional[m3u8.Key], DRM_T]] = None
 
-        i = -1
-        for real_i, segment in enumerate(master.segments):
-            if segment not in unwanted_segments:
-                i += 1
-
-            is_last_segment = (real_i + 1) == len(master.segments)
-
-            def merge(to: Path, via: list[Path], delete: bool = False, include_map_data: bool = False):
-                """
-                Merge all files to a given path, optionally including map data.
-
-                Parameters:
-                    to: The output file with all merged data.
-                    via: List of files to merge, in sequence.
-                    delete: Delete the file once it's been merged.
-                    include_map_data: Whether to include the init map data.
-                """
-                with open(to, "wb") as x:
-                    if include_map_data and map_data and map_data[1]:
-                        x.write(map_data[1])
-                    for file in via:
-                        x.write(file.read_bytes())
-                        x.flush()
-                        if delete:
-                            file.unlink()
-
-            def decrypt(include_this_segment: bool) -> Path:
-                """
-                Decrypt all segments that uses the currently set DRM.
-
-                All segments that will be decrypted with this DRM will be merged together
-                in sequence, prefixed with the init data (if any), and then deleted. Once
-                merged they will be decrypted. The merged and decrypted file names state
-                the range of segments that were used.
-
-                Parameters:
-                    include_this_segment: Whether to include the current segment in the
-                        list of segments to merge and decrypt. This should be False if
-                        decrypting on EXT-X-KEY changes, or True when decrypting on the
-                        last segment.
-
-                Returns the decrypted path.
-                """
-                drm = encryption_data[1]
-                first_segment_i = next(
-                    int(file.stem)
-                    for file in sorted(segment_save_dir.iterdir())
-                    if file.stem.isdigit()
+        def merge(to: Path, via: list[Path], delete: bool = False, include_map_data: bool = False):
+            """
+            Merge all files to a given path, optionally including map data.
+
+            Parameters:
+                to: The output file with all merged data.
+                via: List of files to merge, in sequence.
+                delete: Delete the file once it's been merged.
+                include_map_data: Whether to include the init map data.
+            """
+            with open(to, "wb") as x:
+                if include_map_data and map_data and map_data[1]:
+                    x.write(map_data[1])
+                for file in via:
+                    x.write(file.read_bytes())
+                    x.flush()
+                    if delete:
+                        file.unlink()
+
+        def decrypt(include_this_segment: bool) -> Path:
+            """
+            Decrypt all segments that uses the currently set DRM.
+
+            All segments that will be decrypted with this DRM will be merged together
+            in sequence, prefixed with the init data (if any), and then deleted. Once
+            merged they will be decrypted. The merged and decrypted file names state
+            the range of segments that were used.
+
+            Parameters:
+                include_this_segment: Whether to include the current segment in the
+                    list of segments to merge and decrypt. This should be False if
+                    decrypting on EXT-X-KEY changes, or True when decrypting on the
+                    last segment.
+
+            Returns the decrypted path.
+            """
+            drm = encryption_data[1]
+            first_segment_i = next(
+                int(file.stem)
+                for file in sorted(segment_save_dir.iterdir())
+                if file.stem.isdigit()
+            )
+            last_segment_i = max(0, i - int(not include_this_segment))
+            range_len = (last_segment_i - first_segment_i) + 1
+
+            segment_range = f"{str(first_segment_i).zfill(name_len)}-{str(last_segment_i).zfill(name_len)}"
+            merged_path = segment_save_dir / f"{segment_range}{get_extension(master.segments[last_segment_i].uri)}"
+            decrypted_path = segment_save_dir / f"{merged_path.stem}_decrypted{merged_path.suffix}"
+
+            files = [
+                file
+                for file in sorted(segment_save_dir.iterdir())
+                if file.stem.isdigit() and first_segment_i <= int(file.stem) <= last_segment_i
+            ]
+            if not files:
+                raise ValueError(f"None of the segment files for {segment_range} exist...")
+            elif len(files) != range_len:
+                raise ValueError(f"Missing {range_len - len(files)} segment files for {segment_range}...")
+
+            if isinstance(drm, Widevine):
+                # with widevine we can merge all segments and decrypt once
+                merge(
+                    to=merged_path,
+                    via=files,
+                    delete=True,
+                    include_map_data=True
+                )
+                drm.decrypt(merged_path)
+                merged_path.rename(decrypted_path)
+            else:
+                # with other drm we must decrypt separately and then merge them
+                # for aes this is because each segment likely has 16-byte padding
+                for file in files:
+                    drm.decrypt(file)
+                merge(
+                    to=merged_path,
+                    via=files,
+                    delete=True,
+                    include_map_data=True
                 )
-                last_segment_i = max(0, i - int(not include_this_segment))
-                range_len = (last_segment_i - first_segment_i) + 1
-
-                segment_range = f"{str(first_segment_i).zfill(name_len)}-{str(last_segment_i).zfill(name_len)}"
-                merged_path = segment_save_dir / f"{segment_range}{get_extension(master.segments[last_segment_i].uri)}"
-                decrypted_path = segment_save_dir / f"{merged_path.stem}_decrypted{merged_path.suffix}"
-
-                files = [
-                    file
-                    for file in sorted(segment_save_dir.iterdir())
-                    if file.stem.isdigit() and first_segment_i <= int(file.stem) <= last_segment_i
-                ]
-                if not files:
-                    raise ValueError(f"None of the segment files for {segment_range} exist...")
-                elif len(files) != range_len:
-                    raise ValueError(f"Missing {range_len - len(files)} segment files for {segment_range}...")
-
-                if isinstance(drm, Widevine):
-                    # with widevine we can merge all segments and decrypt once
-                    merge(
-                        to=merged_path,
-                        via=files,
-                        delete=True,
-                        include_map_data=True
-                    )
-                    drm.decrypt(merged_path)
-                    merged_path.rename(decrypted_path)
-                else:
-                    # with other drm we must decrypt separately and then merge them
-                    # for aes this is because each segment likely has 16-byte padding
-                    for file in files:
-                        drm.decrypt(file)
-                    merge(
-                        to=merged_path,
-                        via=files,
-                        delete=True,
-                        include_map_data=True
-                    )
 
-                events.emit(
-                    events.Types.TRACK_DECRYPTED,
-                    track=track,
-                    drm=drm,
-                    segment=decrypted_path
+            events.emit(
+                events.Types.TRACK_DECRYPTED,
+                track=track,
+                drm=drm,
+                segment=decrypted_path
+            )
+
+            return decrypted_path
+
+        def merge_discontinuity(include_this_segment: bool, include_map_data: bool = True):
+            """
+            Merge all segments of the discontinuity.
+
+            All segment files for this discontinuity must already be downloaded and
+            already decrypted (if it needs to be decrypted).
+
+            Parameters:
+                include_this_segment: Whether to include the current segment in the
+                    list of segments to merge and decrypt. This should be False if
+                    decrypting on EXT-X-KEY changes, or True when decrypting on the
+                    last segment.
+                include_map_data: Whether to prepend the init map data before the
+                    segment files when merging.
+            """
+            last_segment_i = max(0, i - int(not include_this_segment))
+
+            files = [
+                file
+                for file in sorted(segment_save_dir.iterdir())
+                if int(file.stem.replace("_decrypted", "").split("-")[-1]) <= last_segment_i
+            ]
+            if files:
+                to_dir = segment_save_dir.parent
+                to_path = to_dir / f"{str(discon_i).zfill(name_len)}{files[-1].suffix}"
+                merge(
+                    to=to_path,
+                    via=files,
+                    delete=True,
+                    include_map_data=include_map_data
                 )
 
-                return decrypted_path
-
-            def merge_discontinuity(include_this_segment: bool, include_map_data: bool = True):
-                """
-                Merge all segments of the discontinuity.
-
-                All segment files for this discontinuity must already be downloaded and
-                already decrypted (if it needs to be decrypted).
-
-                Parameters:
-                    include_this_segment: Whether to include the current segment in the
-                        list of segments to merge and decrypt. This should be False if
-                        decrypting on EXT-X-KEY changes, or True when decrypting on the
-                        last segment.
-                    include_map_data: Whether to prepend the init map data before the
-                        segment files when merging.
-                """
-                last_segment_i = max(0, i - int(not include_this_segment))
-
-                files = [
-                    file
-                    for file in sorted(segment_save_dir.iterdir())
-                    if int(file.stem.replace("_decrypted", "").split("-")[-1]) <= last_segment_i
-                ]
-                if files:
-                    to_dir = segment_save_dir.parent
-                    to_path = to_dir / f"{str(discon_i).zfill(name_len)}{files[-1].suffix}"
-                    merge(
-                        to=to_path,
-                        via=files,
-                        delete=True,
-                        include_map_data=include_map_data
-                    )
+        last_real_i = len(master.segments) - 1
+        i = -1
+        for real_i, segment in enumerate(master.segments):
+            is_wanted = real_i not in unwanted_segments
+            if is_wanted:
+                i += 1
 
-            if segment not in unwanted_segments:
+            is_last_segment = real_i == last_real_i
+
+            if is_wanted:
                 if isinstance(track, Subtitle):
                     segment_file_ext = get_extension(segment.uri)
                     segment_file_path = segment_save_dir / f"{str(i).zfill(name_len)}{segment_file_ext}"
                     segment_data = try_ensure_utf8(segment_file_path.read_bytes())
-                    if track.codec not in (Subtitle.Codec.fVTT, Subtitle.Codec.fTTML):
+                    if (
+                        track.codec not in (Subtitle.Codec.fVTT, Subtitle.Codec.fTTML) and
+                        (b"&lrm;" in segment_data or b"&rlm;" in segment_data)
+                    ):
                         segment_data = segment_data.decode("utf8"). \
                             replace("&lrm;", html.unescape("&lrm;")). \
                             replace("&rlm;", html.unescape("&rlm;")). \
@@ -498,7 +505,7 @@ class HLS:
 
             if segment.keys:
                 key = HLS.get_supported_key(segment.keys)
-                if encryption_data and encryption_data[0] != key and i != 0 and segment not in unwanted_segments:
+                if encryption_data and encryption_data[0] != key and i != 0 and is_wanted:
                     decrypt(include_this_segment=False)
 
                 if key is None:
@@ -566,6 +573,10 @@ class HLS:
 
         save_dir.rmdir()
 
+        # checked on the merged output as it includes any map data the segments rely on
+        if save_path.stat().st_size <= 3:  # Empty UTF-8 BOM == 3 bytes
+            raise IOError("Download failed, the merged file is empty.")
+
         progress(downloaded="Downloaded")
 
         track.path = save_path
@@ -8,6 +8,8 @@ from devine.core.tracks.track import Track
 
 
 class Audio(Track):
+    __slots__ = ("codec", "bitrate", "channels", "joc", "descriptive")
+
     class Codec(str, Enum):
         AAC = "AAC"    # https://wikipedia.org/wiki/Advanced_Audio_Coding
         AC3 = "DD"     # https://wikipedia.org/wiki/Dolby_Digital
@@ -24,6 +24,8 @@ from devine.core.utils.webvtt import merge_segmented_webvtt
 
 
 class Subtitle(Track):
+    __slots__ = ("codec", "cc", "sdh", "forced", "OnConverted")
+
     class Codec(str, Enum):
         SubRip = "SRT"                # https://wikipedia.org/wiki/SubRip
         SubStationAlpha = "SSA"       # https://wikipedia.org/wiki/SubStation_Alpha
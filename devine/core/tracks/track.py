@@ -1,20 +1,26 @@
 import base64
+import errno
+import hashlib
 import html
 import logging
+import os
 import re
 import shutil
 import subprocess
-from collections import defaultdict
-from copy import copy
+from collections import OrderedDict, defaultdict
 from enum import Enum
-from functools import partial
+from functools import lru_cache, partial
+from itertools import chain
 from pathlib import Path
-from typing import Any, Callable, Iterable, Optional, Union
+from threading import Lock
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
 from uuid import UUID
 from zlib import crc32
 
 from langcodes import Language
 from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 
 from devine.core import binaries
 from devine.core.config import config
@@ -25,6 +31,135 @@ from devine.core.events import events
 from devine.core.utilities import get_boxes, try_ensure_utf8
 from devine.core.utils.subprocess import ffprobe
 
+_BYTE_RANGE_RE = re.compile(r"^(\d+)-(\d+)$")
+_KEY_ID_CACHE: OrderedDict[bytes, Optional[UUID]] = OrderedDict()  # init data sha1 digest -> kid
+_KEY_ID_CACHE_LOCK = Lock()
+
+
+@lru_cache(maxsize=1)
+def _get_session() -> Session:
+    """Get the Session shared by session-less init segment probes, so connections are reused."""
+    # this is process-global due to lru_cache, so any headers or cookies on it, including cookies
+    # set by responses, are shared by every service's probes. never add service specific state to
+    # it, callers needing their own headers, cookies, or proxies must pass their own Session
+    session = Session()
+    session.mount("https://", HTTPAdapter(
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.2,
+            status_forcelist=[429, 500, 502, 503, 504]
+        ),
+        pool_connections=64,
+        pool_maxsize=64
+    ))
+    session.mount("http://", session.adapters["https://"])
+    # init data is binary media that won't compress, and compression would muddle the ranges
+    session.headers["Accept-Encoding"] = "identity"
+    return session
+
+
+@lru_cache(maxsize=512)
+def _get_language_name(language: str) -> Optional[str]:
+    """Get a Track name from the script and territory of a language tag, e.g. "Latin, Serbia"."""
+    lang = Language.get(language)
+    if (lang.language or "").lower() == (lang.territory or "").lower():
+        lang = lang.update_dict({"territory": None})  # e.g. en-en, de-DE
+    reduced = lang.simplify_script()
+    extra_parts = []
+    if reduced.script is not None:
+        script = reduced.script_name(max_distance=25)
+        if script and script != "Zzzz":
+            extra_parts.append(script)
+    if reduced.territory is not None:
+        territory = reduced.territory_name(max_distance=25)
+        if territory and territory != "ZZ":
+            territory = territory.removesuffix(" SAR China")
+            extra_parts.append(territory)
+    return ", ".join(extra_parts) or None
+
+
+def _get_data_fingerprint_parts(data: dict) -> Iterator[str]:
+    """
+    Yield the top-level keys and scalar values of Track data as strings for a fingerprint.
+
+    Nested containers and other objects, e.g., parsed manifests or playlists, only yield
+    their type name, so the cost stays bounded by the number of keys no matter how large
+    the data is, and nothing with a run-dependent repr (e.g., memory addresses) is used.
+    """
+    for k, v in data.items():
+        yield str(k)
+        yield repr(v) if isinstance(v, (str, int, float, UUID, type(None))) else type(v).__name__
+
+
+def _get_drm_fingerprint_parts(drm: Optional[Iterable[DRM_T]]) -> Iterator[str]:
+    """Yield the identifying parts of each DRM system, i.e., its Key IDs, or Key and IV, as strings."""
+    if not isinstance(drm, (list, tuple)):
+        # don't consume a one-shot iterable the Track still needs
+        yield type(drm).__name__
+        return
+    for system in drm:
+        yield system.__class__.__name__
+        yield from map(str, getattr(system, "kids", None) or [])
+        for value in (getattr(system, "key", None), getattr(system, "iv", None)):
+            if isinstance(value, bytes):
+                yield value.hex()
+
+
+def _get_key_id(init_data: bytes) -> Optional[UUID]:
+    """
+    Get the DRM encryption Key ID (KID) of initialization data, probing it if not yet known.
+
+    Tracks often share init data, e.g., every key rotation of an HLS playlist
+    using the same map, so results are cached to not parse it each time. The
+    cache is keyed on a digest of the data so that it doesn't keep the init
+    data itself alive.
+    """
+    digest = hashlib.sha1(init_data).digest()
+    with _KEY_ID_CACHE_LOCK:
+        if digest in _KEY_ID_CACHE:
+            _KEY_ID_CACHE.move_to_end(digest)
+            return _KEY_ID_CACHE[digest]
+
+    key_id = _probe_key_id(init_data)
+
+    with _KEY_ID_CACHE_LOCK:
+        _KEY_ID_CACHE[digest] = key_id
+        if len(_KEY_ID_CACHE) > 256:
+            _KEY_ID_CACHE.popitem(last=False)
+
+    return key_id
+
+
+def _probe_key_id(init_data: bytes) -> Optional[UUID]:
+    """
+    Probe the DRM encryption Key ID (KID) from initialization data.
+
+    The boxes are parsed in-process first, ffprobe is only spawned for data
+    that has no usable Track Encryption box.
+    """
+    if init_data[4:8] in (b"ftyp", b"styp", b"moov") and b"tenc" not in init_data and b"uuid" not in init_data:
+        # an mp4 without any (PIFF) Track Encryption box, there's no Key ID for ffprobe to find either
+        return None
+
+    for tenc in get_boxes(init_data, b"tenc"):
+        if tenc.key_ID.int != 0:
+            return tenc.key_ID
+
+    for uuid_box in get_boxes(init_data, b"uuid"):
+        if uuid_box.extended_type == UUID("8974dbce-7be7-4c51-84f9-7148f9882554"):  # tenc
+            tenc = uuid_box.data
+            if tenc.key_ID.int != 0:
+                return tenc.key_ID
+
+    probe = ffprobe(init_data)
+    if probe:
+        for stream in probe.get("streams") or []:
+            enc_key_id = stream.get("tags", {}).get("enc_key_id")
+            if enc_key_id:
+                return UUID(bytes=base64.b64decode(enc_key_id))
+
+    return None
+
 
 class Track:
     class Descriptor(Enum):
@@ -32,6 +167,13 @@ class Track:
         HLS = 2  # https://en.wikipedia.org/wiki/HTTP_Live_Streaming
         DASH = 3  # https://en.wikipedia.org/wiki/Dynamic_Adaptive_Streaming_over_HTTP
 
+    # order matters, it's the order __repr__ lists them in
+    # __dict__ is kept so services can still set their own attributes on tracks
+    __slots__ = (
+        "path", "url", "language", "is_original_lang", "descriptor", "needs_repack", "name", "drm", "edition",
+        "downloader", "_data", "id", "OnSegmentFilter", "__dict__"
+    )
+
     def __init__(
         self,
         url: Union[str, list[str]],
@@ -67,8 +209,8 @@ class Track:
         if not isinstance(data, (dict, defaultdict, type(None))):
             raise TypeError(f"Expected data to be a {dict} or {defaultdict}, not {type(data)}")
 
-        invalid_urls = ", ".join(set(type(x) for x in url if not isinstance(x, str)))
-        if invalid_urls:
+        if isinstance(url, list) and not all(isinstance(x, str) for x in url):
+            invalid_urls = ", ".join(set(str(type(x)) for x in url if not isinstance(x, str)))
             raise TypeError(f"Expected all items in url to be a {str}, but found {invalid_urls}")
 
         if drm is not None:
@@ -94,31 +236,31 @@ class Track:
         self.drm = drm
         self.edition: str = edition
         self.downloader = downloader
-        self._data: defaultdict[Any, Any] = defaultdict(dict)
-        self.data = data or {}
+        # already validated above, build the one defaultdict directly rather than through the setter
+        self._data: defaultdict[Any, Any] = defaultdict(dict, data) if data else defaultdict(dict)
 
         if self.name is None:
-            lang = Language.get(self.language)
-            if (lang.language or "").lower() == (lang.territory or "").lower():
-                lang.territory = None  # e.g. en-en, de-DE
-            reduced = lang.simplify_script()
-            extra_parts = []
-            if reduced.script is not None:
-                script = reduced.script_name(max_distance=25)
-                if script and script != "Zzzz":
-                    extra_parts.append(script)
-            if reduced.territory is not None:
-                territory = reduced.territory_name(max_distance=25)
-                if territory and territory != "ZZ":
-                    territory = territory.removesuffix(" SAR China")
-                    extra_parts.append(territory)
-            self.name = ", ".join(extra_parts) or None
+            self.name = _get_language_name(str(self.language))
 
         if not id_:
-            this = copy(self)
-            this.url = self.url.rsplit("?", maxsplit=1)[0]
-            checksum = crc32(repr(this).encode("utf8"))
-            id_ = hex(checksum)[2:]
+            # only fingerprint the identifying fields, the repr of data and drm can be huge, so only
+            # their bounded parts are used, pass id_ if tracks are only unique by nested data
+            urls = [self.url] if isinstance(self.url, str) else self.url
+            drm_digest = crc32("|".join(_get_drm_fingerprint_parts(self.drm)).encode("utf8"))
+            data_digest = crc32("|".join(_get_data_fingerprint_parts(self._data)).encode("utf8"))
+            fingerprint = "|".join(map(str, (
+                self.__class__.__name__,
+                *(x.rsplit("?", maxsplit=1)[0] for x in urls),
+                self.language,
+                self.is_original_lang,
+                self.descriptor.name,
+                self.needs_repack,
+                self.name,
+                self.edition,
+                drm_digest,
+                data_digest
+            )))
+            id_ = hex(crc32(fingerprint.encode("utf8")))[2:]
 
         self.id = id_
 
@@ -128,11 +270,22 @@ class Track:
     def __repr__(self) -> str:
         return "{name}({items})".format(
             name=self.__class__.__name__,
-            items=", ".join([f"{k}={repr(v)}" for k, v in self.__dict__.items()])
+            items=", ".join(chain(
+                (
+                    f"{k}={repr(getattr(self, k))}"
+                    for cls in reversed(self.__class__.__mro__)
+                    for k in getattr(cls, "__slots__", ())
+                    if k != "__dict__" and hasattr(self, k)
+                ),
+                (f"{k}={repr(v)}" for k, v in self.__dict__.items())
+            ))
         )
 
     def __eq__(self, other: Any) -> bool:
-        return isinstance(other, Track) and self.id == other.id
+        return self is other or (isinstance(other, Track) and self.id == other.id)
+
+    def __hash__(self) -> int:
+        return hash(self.id)
 
     @property
     def data(self) -> defaultdict[Any, Any]:
@@ -177,9 +330,21 @@ class Track:
         max_workers: Optional[int] = None,
         progress: Optional[partial] = None
     ):
-        """Download and optionally Decrypt this Track."""
-        from devine.core.manifests import DASH, HLS
+        """
+        Download and optionally Decrypt this Track.
+
+        Tracks are independent of each other, so multiple Tracks may be downloaded
+        concurrently from separate threads sharing the same Session. The dl command
+        does this with a ThreadPoolExecutor sized by `--downloads`.
 
+        Parameters:
+            session: The Session to download with, its headers, cookies, and proxy are used.
+            prepare_drm: Function to license the Track's DRM with, called with the DRM system
+                and the Track's Key ID.
+            max_workers: The maximum amount of threads the downloader may use for this Track.
+            progress: Function to report download progress to, in the form of keyword arguments
+                accepted by rich's Progress.update().
+        """
         if DOWNLOAD_LICENCE_ONLY.is_set():
             progress(downloaded="[yellow]SKIPPING")
 
@@ -202,13 +367,18 @@ class Track:
             save_dir = save_path.parent
 
         def cleanup():
-            # track file (e.g., "foo.mp4")
-            save_path.unlink(missing_ok=True)
-            # aria2c control file (e.g., "foo.mp4.aria2" or "foo.mp4.aria2__temp")
-            save_path.with_suffix(f"{save_path.suffix}.aria2").unlink(missing_ok=True)
-            save_path.with_suffix(f"{save_path.suffix}.aria2__temp").unlink(missing_ok=True)
-            if save_dir.exists() and save_dir.name.endswith("_segments"):
-                shutil.rmtree(save_dir)
+            # one pass over the temp directory rather than probing for each possible file
+            with os.scandir(save_path.parent) as entries:
+                for entry in entries:
+                    if (
+                        # track file (e.g., "foo.mp4")
+                        entry.name == save_path.name or
+                        # aria2c control file (e.g., "foo.mp4.aria2" or "foo.mp4.aria2__temp")
+                        entry.name.startswith(f"{save_path.name}.aria2")
+                    ):
+                        os.unlink(entry.path)
+                    elif entry.name == save_dir.name and entry.name.endswith("_segments"):
+                        shutil.rmtree(entry.path)
 
         if not DOWNLOAD_LICENCE_ONLY.is_set():
             if config.directories.temp.is_file():
@@ -223,7 +393,9 @@ class Track:
             cleanup()
 
         try:
+            # manifests are imported as needed as they import tracks themselves
             if self.descriptor == self.Descriptor.HLS:
+                from devine.core.manifests import HLS
                 HLS.download_track(
                     track=self,
                     save_path=save_path,
@@ -235,6 +407,7 @@ class Track:
                     license_widevine=prepare_drm
                 )
             elif self.descriptor == self.Descriptor.DASH:
+                from devine.core.manifests import DASH
                 DASH.download_track(
                     track=self,
                     save_path=save_path,
@@ -272,6 +445,7 @@ class Track:
                     if DOWNLOAD_LICENCE_ONLY.is_set():
                         progress(downloaded="[yellow]SKIPPED")
                     else:
+                        downloaded_size: Optional[int] = None
                         for status_update in self.downloader(
                             urls=self.url,
                             output_dir=save_path.parent,
@@ -284,10 +458,20 @@ class Track:
                             file_downloaded = status_update.get("file_downloaded")
                             if not file_downloaded:
                                 progress(**status_update)
+                            elif status_update.get("written") is not None:
+                                downloaded_size = (downloaded_size or 0) + status_update["written"]
 
                         # see https://github.com/devine-dl/devine/issues/71
                         save_path.with_suffix(f"{save_path.suffix}.aria2__temp").unlink(missing_ok=True)
 
+                        if downloaded_size is None:
+                            # not every downloader reports what it wrote (e.g., aria2c)
+                            downloaded_size = os.stat(save_path).st_size
+
+                        # no point decrypting or fixing up the file if nothing was actually downloaded
+                        if downloaded_size <= 3:  # Empty UTF-8 BOM == 3 bytes
+                            raise IOError("Download failed, the downloaded file is empty.")
+
                         self.path = save_path
                         events.emit(events.Types.TRACK_DOWNLOADED, track=self)
 
@@ -304,13 +488,15 @@ class Track:
                             progress(downloaded="Decrypted", completed=100)
 
                         if track_type == "Subtitle" and self.codec.name not in ("fVTT", "fTTML"):
-                            track_data = self.path.read_bytes()
-                            track_data = try_ensure_utf8(track_data)
-                            track_data = track_data.decode("utf8"). \
-                                replace("&lrm;", html.unescape("&lrm;")). \
-                                replace("&rlm;", html.unescape("&rlm;")). \
-                                encode("utf8")
-                            self.path.write_bytes(track_data)
+                            original_data = self.path.read_bytes()
+                            track_data = try_ensure_utf8(original_data)
+                            if b"&lrm;" in track_data or b"&rlm;" in track_data:
+                                # the entities and their characters are both UTF-8, no need to decode
+                                track_data = track_data. \
+                                    replace(b"&lrm;", html.unescape("&lrm;").encode("utf8")). \
+                                    replace(b"&rlm;", html.unescape("&rlm;").encode("utf8"))
+                            if track_data is not original_data:
+                                self.path.write_bytes(track_data)
 
                         progress(downloaded="Downloaded")
                 except KeyboardInterrupt:
@@ -330,15 +516,11 @@ class Track:
             # we stopped during the download, let's exit
             return
 
-        if not DOWNLOAD_LICENCE_ONLY.is_set():
-            if self.path.stat().st_size <= 3:  # Empty UTF-8 BOM == 3 bytes
-                raise IOError("Download failed, the downloaded file is empty.")
-
         events.emit(events.Types.TRACK_DOWNLOADED, track=self)
 
     def delete(self) -> None:
         if self.path:
-            self.path.unlink()
+            self.path.unlink(missing_ok=True)
             self.path = None
 
     def move(self, target: Union[Path, str]) -> Path:
@@ -348,7 +530,7 @@ class Track:
 
         Raises:
             TypeError: If the target argument is not the expected type.
-            ValueError: If track has no file to move, or the target does not exist.
+            ValueError: If track has no file to move.
             OSError: If the file somehow failed to move.
 
         Returns the new location of the track.
@@ -362,12 +544,13 @@ class Track:
         if not isinstance(target, Path):
             target = Path(target)
 
-        if not target.exists():
-            raise ValueError(f"Target file {repr(target)} does not exist")
-
-        moved_to = Path(shutil.move(self.path, target))
-        if moved_to.resolve() != target.resolve():
-            raise OSError(f"Failed to move {self.path} to {target}")
+        try:
+            os.replace(self.path, target)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # cannot rename across filesystems, fall back to copying and deleting
+            shutil.move(self.path, target)
 
         self.path = target
         return target
@@ -380,9 +563,9 @@ class Track:
         """
         Probe the DRM encryption Key ID (KID) for this specific track.
 
-        It currently supports finding the Key ID by probing the track's stream
-        with ffprobe for `enc_key_id` data, as well as for mp4 `tenc` (Track
-        Encryption) boxes.
+        It currently supports finding the Key ID from mp4 `tenc` (Track Encryption)
+        boxes, falling back to probing the track's stream with ffprobe for
+        `enc_key_id` data.
 
         It explicitly ignores PSSH information like the `PSSH` box, as the box
         is likely to contain multiple Key IDs that may or may not be for this
@@ -400,22 +583,7 @@ class Track:
         if not isinstance(init_data, bytes):
             raise TypeError(f"Expected init_data to be bytes, not {init_data!r}")
 
-        probe = ffprobe(init_data)
-        if probe:
-            for stream in probe.get("streams") or []:
-                enc_key_id = stream.get("tags", {}).get("enc_key_id")
-                if enc_key_id:
-                    return UUID(bytes=base64.b64decode(enc_key_id))
-
-        for tenc in get_boxes(init_data, b"tenc"):
-            if tenc.key_ID.int != 0:
-                return tenc.key_ID
-
-        for uuid_box in get_boxes(init_data, b"uuid"):
-            if uuid_box.extended_type == UUID("8974dbce-7be7-4c51-84f9-7148f9882554"):  # tenc
-                tenc = uuid_box.data
-                if tenc.key_ID.int != 0:
-                    return tenc.key_ID
+        return _get_key_id(init_data)
 
     def get_init_segment(
         self,
@@ -430,18 +598,16 @@ class Track:
         HLS and DASH tracks must explicitly provide a URL to the init segment or file.
         Providing the byte-range for the init segment is recommended where possible.
 
-        If `byte_range` is not set, it will make a HEAD request and check the size of
-        the file. If the size could not be determined, it will download up to the first
-        20KB only, which should contain the entirety of the init segment. You may
-        override this by changing the `maximum_size`.
+        If `byte_range` is not set, it will request up to the first 20KB only, which
+        should contain the entirety of the init segment. You may override this by
+        changing the `maximum_size`.
 
         The default maximum_size of 20000 (20KB) is a tried-and-tested value that
         seems to work well across the board.
 
         Parameters:
-            maximum_size: Size to assume as the content length if byte-range is not
-                used, the content size could not be determined, or the content size
-                is larger than it. A value of 20000 (20KB) or higher is recommended.
+            maximum_size: Maximum amount of bytes to download if byte-range is not
+                used. A value of 20000 (20KB) or higher is recommended.
             url: Explicit init map or file URL to probe from.
             byte_range: Range of bytes to download from the explicit or implicit URL.
             session: Session context, e.g., authorization and headers.
@@ -463,45 +629,45 @@ class Track:
             url = self.url
 
         if not session:
-            session = Session()
-
-        content_length = maximum_size
+            session = _get_session()
 
         if byte_range:
             if not isinstance(byte_range, str):
                 raise TypeError(f"Expected byte_range to be a str, not {byte_range!r}")
-            if not re.match(r"^\d+-\d+$", byte_range):
+            byte_range_match = _BYTE_RANGE_RE.match(byte_range)
+            if not byte_range_match:
                 raise ValueError(f"The value of byte_range is unrecognized: '{byte_range}'")
-            start, end = byte_range.split("-")
+            start, end = map(int, byte_range_match.groups())
             if start > end:
                 raise ValueError(f"The start range cannot be greater than the end range: {start}>{end}")
-        else:
-            size_test = session.head(url)
-            if "Content-Length" in size_test.headers:
-                content_length_header = int(size_test.headers["Content-Length"])
-                if content_length_header > 0:
-                    content_length = min(content_length_header, maximum_size)
-            range_test = session.head(url, headers={"Range": "bytes=0-1"})
-            if range_test.status_code == 206:
-                byte_range = f"0-{content_length-1}"
-
-        if byte_range:
-            res = session.get(
+            with session.get(
                 url=url,
                 headers={
-                    "Range": f"bytes={byte_range}"
-                }
-            )
-            res.raise_for_status()
-            init_data = res.content
+                    "Range": f"bytes={start}-{end}"
+                },
+                stream=True
+            ) as res:
+                res.raise_for_status()
+                if res.status_code == 206:
+                    init_data = res.raw.read(end - start + 1, decode_content=True)
+                else:
+                    # the range was ignored and the whole file is coming, only read up to the end of it
+                    init_data = res.raw.read(end + 1, decode_content=True)[start:]
         else:
-            init_data = None
-            with session.get(url, stream=True) as s:
-                for chunk in s.iter_content(content_length):
-                    init_data = chunk
-                    break
+            # servers supporting ranges only send what's asked for, otherwise stop
+            # reading once we have enough, either way it's only one request
+            with session.get(
+                url,
+                headers={
+                    "Range": f"bytes=0-{maximum_size - 1}"
+                },
+                stream=True
+            ) as s:
+                s.raise_for_status()
+                # unlike iter_content's first chunk, this keeps reading until it has enough or hits EOF
+                init_data = s.raw.read(maximum_size, decode_content=True)
             if not init_data:
-                raise ValueError(f"Failed to read {content_length} bytes from the track URI.")
+                raise ValueError(f"Failed to read {maximum_size} bytes from the track URI.")
 
         return init_data
 
@@ -520,6 +686,7 @@ class Track:
                 [
                     binaries.FFMPEG, "-hide_banner",
                     "-loglevel", "error",
+                    "-nostats",  # progress is still printed to stderr below info level
                     "-i", original_path,
                     *(extra_args or []),
                     # Following are very important!
@@ -529,7 +696,8 @@ class Track:
                     str(output_path)
                 ],
                 check=True,
-                stdout=subprocess.PIPE,
+                # nothing is written to stdout, stderr is checked below for known errors
+                stdout=subprocess.DEVNULL,
                 stderr=subprocess.PIPE
             )
 
@@ -542,8 +710,10 @@ class Track:
             else:
                 raise
 
-        original_path.unlink()
-        self.path = output_path
+        # swap the repack in place of the original, one rename rather than a delete and a new path
+        os.replace(output_path, original_path)
+        # e.g., ccextractor repacks video tracks before dl gets to its own repack step
+        self.needs_repack = False
 
 
 __all__ = ("Track",)
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 import logging
+import re
 import subprocess
-from functools import partial
+from collections import defaultdict
+from functools import lru_cache, partial
+from itertools import chain
 from pathlib import Path
 from typing import Callable, Iterator, Optional, Sequence, Union
 
@@ -11,6 +14,7 @@ from rich.progress import BarColumn, Progress, SpinnerColumn, TextColumn, TimeRe
 from rich.table import Table
 from rich.tree import Tree
 
+from devine.core import binaries
 from devine.core.config import config
 from devine.core.console import console
 from devine.core.constants import LANGUAGE_MAX_DISTANCE, AnyTrack, TrackT
@@ -22,7 +26,15 @@ from devine.core.tracks.subtitle import Subtitle
 from devine.core.tracks.track import Track
 from devine.core.tracks.video import Video
 from devine.core.utilities import is_close_match, sanitize_filename
-from devine.core.utils.collections import as_list, flatten
+from devine.core.utils.collections import flatten
+
+_MKVMERGE_PROGRESS_RE = re.compile(rb"^#GUI#progress (\d+)%")
+
+
+@lru_cache(maxsize=1024)
+def _is_supported_match(language: str, supported: str) -> bool:
+    # cached as it's checked for every track against every wanted language
+    return closest_supported_match(language, [supported], LANGUAGE_MAX_DISTANCE) is not None
 
 
 class Tracks:
@@ -57,7 +69,7 @@ class Tracks:
             self.add(args)
 
     def __iter__(self) -> Iterator[AnyTrack]:
-        return iter(as_list(self.videos, self.audio, self.subtitles))
+        return chain(self.videos, self.audio, self.subtitles)
 
     def __len__(self) -> int:
         return len(self.videos) + len(self.audio) + len(self.subtitles)
@@ -83,47 +95,42 @@ class Tracks:
         )
 
     def __str__(self) -> str:
-        rep = {
-            Video: [],
-            Audio: [],
-            Subtitle: [],
-            Chapter: [],
-            Attachment: []
-        }
-        tracks = [*list(self), *self.chapters]
+        # group in one pass, the map's key order is the order the groups are listed in
+        groups: dict[type, list] = {type_: [] for type_ in self.TRACK_ORDER_MAP}
+        for track in [*self, *self.chapters]:
+            groups[type(track)].append(track)
 
-        for track in sorted(tracks, key=lambda t: self.TRACK_ORDER_MAP[type(t)]):
-            if not rep[type(track)]:
-                count = sum(type(x) is type(track) for x in tracks)
-                rep[type(track)].append("{count} {type} Track{plural}{colon}".format(
-                    count=count,
-                    type=track.__class__.__name__,
-                    plural="s" if count != 1 else "",
-                    colon=":" if count > 0 else ""
-                ))
-            rep[type(track)].append(str(track))
-
-        for type_ in list(rep):
-            if not rep[type_]:
-                del rep[type_]
+        rep = []
+        for type_, tracks in groups.items():
+            if not tracks:
                 continue
-            rep[type_] = "\n".join(
-                [rep[type_][0]] +
-                [f"├─ {x}" for x in rep[type_][1:-1]] +
-                [f"└─ {rep[type_][-1]}"]
-            )
-        rep = "\n".join(list(rep.values()))
+            count = len(tracks)
+            rep.append("\n".join(
+                ["{count} {type} Track{plural}:".format(
+                    count=count,
+                    type=type_.__name__,
+                    plural="s" if count != 1 else ""
+                )] +
+                [f"├─ {x}" for x in tracks[:-1]] +
+                [f"└─ {tracks[-1]}"]
+            ))
 
-        return rep
+        return "\n".join(rep)
 
     def tree(self, add_progress: bool = False) -> tuple[Tree, list[partial]]:
-        all_tracks = [*list(self), *self.chapters, *self.attachments]
+        all_tracks = [*self, *self.chapters, *self.attachments]
 
         progress_callables = []
 
+        buckets: dict[type, list] = {track_type: [] for track_type in self.TRACK_ORDER_MAP}
+        for track in all_tracks:
+            track_type = type(track)
+            if track_type not in buckets:  # subclassed track types
+                track_type = next(x for x in buckets if isinstance(track, x))
+            buckets[track_type].append(track)
+
         tree = Tree("", hide_root=True)
-        for track_type in self.TRACK_ORDER_MAP:
-            tracks = list(x for x in all_tracks if isinstance(x, track_type))
+        for track_type, tracks in buckets.items():
             if not tracks:
                 continue
             num_tracks = len(tracks)
@@ -174,11 +181,23 @@ class Tracks:
     ) -> None:
         """Add a provided track to its appropriate array and ensuring it's not a duplicate."""
         if isinstance(tracks, Tracks):
-            tracks = [*list(tracks), *tracks.chapters, *tracks.attachments]
+            tracks = [*tracks, *tracks.chapters, *tracks.attachments]
+
+        # collect the existing IDs once rather than scanning every track for each one added,
+        # it's built per-call as the track lists are public and may be reassigned by callers
+        track_ids = {x.id for x in self}
+
+        add_map = {
+            Video: self.videos.append,
+            Audio: self.audio.append,
+            Subtitle: self.subtitles.append,
+            Chapter: self.chapters.add,
+            Attachment: self.attachments.append
+        }
 
         duplicates = 0
         for track in flatten(tracks):
-            if self.exists(by_id=track.id):
+            if track.id in track_ids:
                 if not warn_only:
                     raise ValueError(
                         "One or more of the provided Tracks is a duplicate. "
@@ -191,61 +210,93 @@ class Tracks:
                 duplicates += 1
                 continue
 
-            if isinstance(track, Video):
-                self.videos.append(track)
-            elif isinstance(track, Audio):
-                self.audio.append(track)
-            elif isinstance(track, Subtitle):
-                self.subtitles.append(track)
-            elif isinstance(track, Chapter):
-                self.chapters.add(track)
-            elif isinstance(track, Attachment):
-                self.attachments.append(track)
-            else:
-                raise ValueError("Track type was not set or is invalid.")
+            add = add_map.get(type(track))
+            if not add:  # subclassed track types
+                add = next((v for k, v in add_map.items() if isinstance(track, k)), None)
+                if not add:
+                    raise ValueError("Track type was not set or is invalid.")
+            add(track)
+
+            if isinstance(track, Track):
+                track_ids.add(track.id)
 
         log = logging.getLogger("Tracks")
 
         if duplicates:
             log.warning(f" - Found and skipped {duplicates} duplicate tracks...")
 
+    @staticmethod
+    def _get_language_sort_key(
+        track: AnyTrack,
+        languages: Sequence[Union[str, Language]],
+        alphabetical: bool = False
+    ) -> tuple:
+        """
+        Get a sort key that orders tracks by how they match the prioritized languages.
+
+        It's the same order as sorting by each language separately from lowest to highest
+        priority, but in one sort. With `alphabetical`, tracks matching the top language
+        are also ordered by their language tag, which then ties for every other language.
+        """
+        key = tuple(not is_close_match(language, [track.language]) for language in languages)
+        if alphabetical and key:
+            key = (key[0], str(track.language), *key[1:])
+        return key
+
+    @classmethod
+    def _sort_by_language(
+        cls,
+        tracks: list[TrackT],
+        by_language: Optional[Sequence[Union[str, Language]]],
+        base_key: Callable[[TrackT], tuple],
+        alphabetical: bool = False
+    ) -> None:
+        """
+        Sort tracks by the base key and then by the prioritized languages, in one sort.
+
+        The languages are resolved from lowest to highest priority, with `all` being the
+        language of the first original language track in the order the lower priority
+        languages sort them in, as it was when each language was sorted separately.
+        """
+        def get_key(track: TrackT) -> tuple:
+            return (*cls._get_language_sort_key(track, languages, alphabetical), *base_key(track))
+
+        languages: list[Union[str, Language]] = []  # highest priority first
+        for language in reversed(by_language or []):
+            if str(language) == "all":
+                original_tracks = [x for x in tracks if x.is_original_lang]
+                if len({str(x.language) for x in original_tracks}) > 1:
+                    # which one is first depends on the order so far, but only sort if it matters
+                    original_tracks.sort(key=get_key)
+                language = original_tracks[0].language if original_tracks else ""
+            if language:
+                languages.insert(0, language)
+
+        tracks.sort(key=get_key)
+
     def sort_videos(self, by_language: Optional[Sequence[Union[str, Language]]] = None) -> None:
         """Sort video tracks by bitrate, and optionally language."""
-        if not self.videos:
+        if len(self.videos) < 2:  # nothing to sort
             return
-        # bitrate
-        self.videos.sort(
-            key=lambda x: float(x.bitrate or 0.0),
-            reverse=True
+        # language, then bitrate
+        self._sort_by_language(
+            self.videos,
+            by_language,
+            base_key=lambda x: (-float(x.bitrate or 0.0),),
+            alphabetical=True
         )
-        # language
-        for language in reversed(by_language or []):
-            if str(language) == "all":
-                language = next((x.language for x in self.videos if x.is_original_lang), "")
-            if not language:
-                continue
-            self.videos.sort(key=lambda x: str(x.language))
-            self.videos.sort(key=lambda x: not is_close_match(language, [x.language]))
 
     def sort_audio(self, by_language: Optional[Sequence[Union[str, Language]]] = None) -> None:
         """Sort audio tracks by bitrate, descriptive, and optionally language."""
-        if not self.audio:
+        if len(self.audio) < 2:  # nothing to sort
             return
-        # bitrate
-        self.audio.sort(
-            key=lambda x: float(x.bitrate or 0.0),
-            reverse=True
+        # language, then descriptive, then bitrate
+        self._sort_by_language(
+            self.audio,
+            by_language,
+            base_key=lambda x: (str(x.language) if x.descriptive else "", -float(x.bitrate or 0.0)),
+            alphabetical=True
         )
-        # descriptive
-        self.audio.sort(key=lambda x: str(x.language) if x.descriptive else "")
-        # language
-        for language in reversed(by_language or []):
-            if str(language) == "all":
-                language = next((x.language for x in self.audio if x.is_original_lang), "")
-            if not language:
-                continue
-            self.audio.sort(key=lambda x: str(x.language))
-            self.audio.sort(key=lambda x: not is_close_match(language, [x.language]))
 
     def sort_subtitles(self, by_language: Optional[Sequence[Union[str, Language]]] = None) -> None:
         """
@@ -263,19 +314,14 @@ class Tracks:
           - Hard of Hearing (SDH/CC)
           (Least to most captions expected in the subtitle)
         """
-        if not self.subtitles:
+        if len(self.subtitles) < 2:  # nothing to sort
             return
-        # language groups
-        self.subtitles.sort(key=lambda x: str(x.language))
-        self.subtitles.sort(key=lambda x: x.sdh or x.cc)
-        self.subtitles.sort(key=lambda x: x.forced, reverse=True)
-        # sections
-        for language in reversed(by_language or []):
-            if str(language) == "all":
-                language = next((x.language for x in self.subtitles if x.is_original_lang), "")
-            if not language:
-                continue
-            self.subtitles.sort(key=lambda x: is_close_match(language, [x.language]), reverse=True)
+        # sections, then language groups
+        self._sort_by_language(
+            self.subtitles,
+            by_language,
+            base_key=lambda x: (not x.forced, bool(x.sdh or x.cc), str(x.language))
+        )
 
     def select_video(self, x: Callable[[Video], bool]) -> None:
         self.videos = list(filter(x, self.videos))
@@ -287,21 +333,18 @@ class Tracks:
         self.subtitles = list(filter(x, self.subtitles))
 
     def by_resolutions(self, resolutions: list[int], per_resolution: int = 0) -> None:
-        # Note: Do not merge these list comprehensions. They must be done separately so the results
-        # from the 16:9 canvas check is only used if there's no exact height resolution match.
+        # Note: Do not merge these buckets. The 16:9 canvas matches must only be used if there's
+        # no exact height resolution match.
+        by_height = defaultdict(list)
+        by_canvas = defaultdict(list)  # 16:9 canvas
+        for x in self.videos:
+            by_height[x.height].append(x)
+            if x.width:
+                by_canvas[int(x.width * (9 / 16))].append(x)
+
         selected = []
         for resolution in resolutions:
-            matches = [  # exact matches
-                x
-                for x in self.videos
-                if x.height == resolution
-            ]
-            if not matches:
-                matches = [  # 16:9 canvas matches
-                    x
-                    for x in self.videos
-                    if int(x.width * (9 / 16)) == resolution
-                ]
+            matches = by_height.get(resolution) or by_canvas.get(resolution, [])
             selected.extend(matches[:per_resolution or None])
         self.videos = selected
 
@@ -309,10 +352,11 @@ class Tracks:
     def by_language(tracks: list[TrackT], languages: list[str], per_language: int = 0) -> list[TrackT]:
         selected = []
         for language in languages:
+            language = str(language)
             selected.extend([
                 x
                 for x in tracks
-                if closest_supported_match(x.language, [language], LANGUAGE_MAX_DISTANCE)
+                if _is_supported_match(str(x.language), language)
             ][:per_language or None])
         return selected
 
@@ -327,8 +371,21 @@ class Tracks:
             progress: Update a rich progress bar via `completed=...`. This must be the
                 progress object's update() func, pre-set with task id via functools.partial.
         """
+        if not binaries.MKVToolNix:
+            raise EnvironmentError("MKVToolNix executable \"mkvmerge\" was not found but is required for this call.")
+
+        # validate everything before any events are fired or the chapters file is written
+        for tracks, error in (
+            (self.videos, "Video Track must be downloaded before muxing..."),
+            (self.audio, "Audio Track must be downloaded before muxing..."),
+            (self.subtitles, "Text Track must be downloaded before muxing..."),
+            (self.attachments, "Attachment File was not found...")
+        ):
+            if any(not x.path or not x.path.exists() for x in tracks):
+                raise ValueError(error)
+
         cl = [
-            "mkvmerge",
+            binaries.MKVToolNix,
             "--no-date",  # remove dates from the output for security
         ]
 
@@ -336,8 +393,6 @@ class Tracks:
             cl.extend(["--title", title])
 
         for i, vt in enumerate(self.videos):
-            if not vt.path or not vt.path.exists():
-                raise ValueError("Video Track must be downloaded before muxing...")
             events.emit(events.Types.TRACK_MULTIPLEX, track=vt)
             cl.extend([
                 "--language", f"0:{vt.language}",
@@ -348,8 +403,6 @@ class Tracks:
             ])
 
         for i, at in enumerate(self.audio):
-            if not at.path or not at.path.exists():
-                raise ValueError("Audio Track must be downloaded before muxing...")
             events.emit(events.Types.TRACK_MULTIPLEX, track=at)
             cl.extend([
                 "--track-name", f"0:{at.get_track_name() or ''}",
@@ -361,11 +414,10 @@ class Tracks:
                 "(", str(at.path), ")"
             ])
 
+        audio_language = self.audio[0].language if self.audio else None
         for st in self.subtitles:
-            if not st.path or not st.path.exists():
-                raise ValueError("Text Track must be downloaded before muxing...")
             events.emit(events.Types.TRACK_MULTIPLEX, track=st)
-            default = bool(self.audio and is_close_match(st.language, [self.audio[0].language]) and st.forced)
+            default = bool(st.forced and audio_language and is_close_match(st.language, [audio_language]))
             cl.extend([
                 "--track-name", f"0:{st.get_track_name() or ''}",
                 "--language", f"0:{st.language}",
@@ -389,13 +441,11 @@ class Tracks:
             chapters_path = None
 
         for attachment in self.attachments:
-            if not attachment.path or not attachment.path.exists():
-                raise ValueError("Attachment File was not found...")
             cl.extend([
                 "--attachment-description", attachment.description or "",
                 "--attachment-mime-type", attachment.mime_type,
                 "--attachment-name", attachment.name,
-                "--attach-file", str(attachment.path.resolve())
+                "--attach-file", str(attachment.path.absolute())
             ])
 
         output_path = (
@@ -415,12 +465,15 @@ class Tracks:
                 *cl,
                 "--output", str(output_path),
                 "--gui-mode"
-            ], text=True, stdout=subprocess.PIPE)
-            for line in iter(p.stdout.readline, ""):
-                if line.startswith("#GUI#error") or line.startswith("#GUI#warning"):
-                    errors.append(line)
-                if "progress" in line:
-                    progress(total=100, completed=int(line.strip()[14:-1]))
+            ], stdout=subprocess.PIPE)
+            # read as bytes, only the few error and warning lines need to be decoded
+            for line in iter(p.stdout.readline, b""):
+                if line.startswith((b"#GUI#error", b"#GUI#warning")):
+                    errors.append(line.decode("utf8", errors="replace"))
+                    continue
+                m = _MKVMERGE_PROGRESS_RE.match(line)
+                if m:
+                    progress(total=100, completed=int(m.group(1)))
             return output_path, p.wait(), errors
         finally:
             if chapters_path:
@@ -18,6 +18,8 @@ from devine.core.utilities import FPS, get_boxes
 
 
 class Video(Track):
+    __slots__ = ("codec", "range", "bitrate", "width", "height", "fps")
+
     class Codec(str, Enum):
         AVC = "H.264"
         HEVC = "H.265"
@@ -345,8 +347,8 @@ class Video(Track):
         with self.path.open("rb") as f:
             # assuming 20KB is enough to contain the c608 box.
             # ffprobe will fail, so a c608 box check must be done.
-            c608_count = len(list(get_boxes(f.read(20000), b"c608")))
-        if c608_count > 0:
+            has_c608 = next(get_boxes(f.read(20000), b"c608"), None) is not None
+        if has_c608:
             # TODO: Figure out the real language, it might be different
             #       CEA-608 boxes doesnt seem to carry language information :(
             # TODO: Figure out if the CC language is original lang or not.
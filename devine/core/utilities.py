@@ -9,6 +9,7 @@ import time
 import unicodedata
 from collections import defaultdict
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from types import ModuleType
 from typing import Optional, Sequence, Union
@@ -108,12 +109,19 @@ def sanitize_filename(filename: str, spacer: str = ".") -> str:
     return filename
 
 
+@lru_cache(maxsize=1024)
+def _get_closest_match_distance(language: str, languages: tuple[str, ...]) -> int:
+    # this is called within sort keys and selection filters for every track, and the same
+    # few language pairs come up again and again, so cache it rather than re-parse each time
+    return closest_match(language, list(languages))[1]
+
+
 def is_close_match(language: Union[str, Language], languages: Sequence[Union[str, Language, None]]) -> bool:
     """Check if a language is a close match to any of the provided languages."""
-    languages = [x for x in languages if x]
+    languages = tuple(str(x) for x in languages if x)
     if not languages:
         return False
-    return closest_match(language, list(map(str, languages)))[1] <= LANGUAGE_MAX_DISTANCE
+    return _get_closest_match_distance(str(language), languages) <= LANGUAGE_MAX_DISTANCE
 
 
 def get_boxes(data: bytes, box_type: bytes, as_bytes: bool = False) -> Box:
@@ -126,15 +134,16 @@ def get_boxes(data: bytes, box_type: bytes, as_bytes: bool = False) -> Box:
 
     offset = 0
     while True:
-        try:
-            index = data[offset:].index(box_type)
-        except ValueError:
-            break
+        # find from an offset rather than slicing, which would copy the rest of the data each time
+        index = data.find(box_type, offset)
         if index < 0:
             break
+        offset = index + len(box_type)  # skip past this find if it's not a usable box
         index -= 4  # size is before box type and is 4 bytes long
+        if index < 0:
+            continue
         try:
-            box = Box.parse(data[offset:][index:])
+            box = Box.parse(data[index:])
         except IOError:
             # since get_init_segment might cut off unexpectedly, pymp4 may be unable to read
             # the expected amounts of data and complain, so let's just end the function here
@@ -145,10 +154,9 @@ def get_boxes(data: bytes, box_type: bytes, as_bytes: bool = False) -> Box:
                 # some services don't even put valid data and mix it up with avc1...
                 continue
             raise e
-        if as_bytes:
-            box = Box.build(box)
-        offset += index + len(Box.build(box))
-        yield box
+        box_data = Box.build(box)
+        offset = index + len(box_data)
+        yield box_data if as_bytes else box
 
 
 def ap_case(text: str, keep_spaces: bool = False, stop_words: tuple[str] = None) -> str:
@@ -173,7 +181,7 @@ def ap_case(text: str, keep_spaces: bool = False, stop_words: tuple[str] = None)
     words = splitter.split(text)
 
     return "".join([
-        [" ", word][keep_spaces] if re.match(r"\s+", word) else
+        (word if keep_spaces else " ") if word.isspace() else
         word if splitter.match(word) else
         word.lower() if i != 0 and i != len(words) - 1 and word.lower() in stop_words else
         word.capitalize()
@@ -218,6 +226,9 @@ def try_ensure_utf8(data: bytes) -> bytes:
     Returns the input data encoded in UTF-8 if successful. If unable to detect the
     encoding of the input data, then the original data is returned as-received.
     """
+    if data.isascii():
+        # already valid UTF-8, and unlike decoding this does not copy the data
+        return data
     try:
         data.decode("utf8")
         return data